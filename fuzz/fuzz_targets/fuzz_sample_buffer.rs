@@ -7,10 +7,10 @@ use libfuzzer_sys::{
 use mu_rust::{Asdu, Sample, sample_buffer::SampleBufferQueue};
 
 #[derive(Debug)]
-struct AsduWrapper(Asdu);
+struct AsduWrapper<'b>(Asdu<'b>);
 
-impl Arbitrary<'_> for AsduWrapper {
-	fn arbitrary(u: &mut Unstructured<'_>) -> libfuzzer_sys::arbitrary::Result<Self> {
+impl<'b> Arbitrary<'b> for AsduWrapper<'b> {
+	fn arbitrary(u: &mut Unstructured<'b>) -> libfuzzer_sys::arbitrary::Result<Self> {
 		Ok(Self(Asdu {
 			svid: u.arbitrary()?,
 			datset: u.arbitrary()?,
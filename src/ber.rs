@@ -126,16 +126,19 @@ pub fn read_length(reader: &mut BytesReader<'_>) -> Result<usize, DecodeError> {
 
 		// Definite form, long
 		value => {
-			let mut length: usize = 0;
-			for _ in 0..(value & 0b0111_1111) {
-				if length.leading_zeros() < 8 {
-					return Err(DecodeError::LengthOutOfRange);
-				}
+			let bytes = reader.read_bytes((value & 0b0111_1111) as usize)?;
+
+			// Skip over any redundant leading zero bytes, so that overlong encodings of in-range values are still
+			// accepted.
+			let bytes = &bytes[bytes.iter().position(|&b| b != 0).unwrap_or(bytes.len())..];
 
-				length <<= 8;
-				length |= reader.read_u8()? as usize;
+			if bytes.len() > size_of::<usize>() {
+				return Err(DecodeError::LengthOutOfRange);
 			}
-			Ok(length)
+
+			let mut be_bytes = [0; size_of::<usize>()];
+			be_bytes[size_of::<usize>() - bytes.len()..].copy_from_slice(bytes);
+			Ok(usize::from_be_bytes(be_bytes))
 		}
 	}
 }
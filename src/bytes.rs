@@ -50,6 +50,8 @@ impl<'b> BytesReader<'b> {
 		Ok(value)
 	}
 
+	// Currently only used by tests, but kept as part of the reader's basic interface.
+	#[cfg_attr(not(test), allow(dead_code))]
 	pub fn read_u16_be(&mut self) -> Result<u16, BytesReaderError> {
 		self.read_u8_array().map(u16::from_be_bytes)
 	}
@@ -28,4 +28,7 @@ pub struct Configuration {
 	pub channels: Vec<OutputChannel>,
 	pub destination: SocketAddr,
 	pub mac_address: MacAddress,
+	/// The number of microseconds for which a blocking receive should busy poll the network driver for new frames
+	/// before sleeping. If not set, busy polling is disabled.
+	pub busy_poll: Option<u32>,
 }
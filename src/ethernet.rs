@@ -83,6 +83,103 @@ pub struct RecvInfo {
 	pub timestamp_ns: u32,
 }
 
+/// The maximum size of an Ethernet frame is 1522 bytes.
+pub const MAX_FRAME_LENGTH: usize = 1522;
+
+/// The maximum number of frames which can be received by a single call to `EthernetSocket::recv_batch`.
+pub const BATCH_LENGTH: usize = 32;
+
+// This matches Linux's `__kernel_timespec` type, which uses 64 bit fields even on 32 bit systems.
+#[repr(C)]
+struct KernelTimespec {
+	tv_sec: c_longlong,
+	tv_nsec: c_longlong,
+}
+
+// Timestamps are received as control messages (also known as ancillary data), which requires a separate buffer.
+// This buffer must have enough space for both the timestamp and some additional metadata; the total size is
+// calculated using `CMSG_SPACE`.
+const CMSG_BUFFER_LENGTH: usize = unsafe { libc::CMSG_SPACE(size_of::<KernelTimespec>() as u32) } as usize;
+
+// The control message buffer must have the same alignment as the `cmsghdr` type. A struct is used to control
+// its alignment.
+#[repr(C)]
+struct CMsgBuffer {
+	// Since the struct uses the C representation, the first member is guaranteed to be at offset 0, meaning it
+	// has the same alignment as the struct.
+	buffer: [u8; CMSG_BUFFER_LENGTH],
+	// A zero-sized array does not affect the size of the containing struct, but does affect its alignment.
+	// Since a struct has the same alignment as its most aligned member, this guarantees that it will have an
+	// alignment at least as large as `cmsghdr`.
+	_align: [libc::cmsghdr; 0],
+}
+
+impl CMsgBuffer {
+	fn new() -> Self {
+		Self {
+			buffer: [0; CMSG_BUFFER_LENGTH],
+			_align: [],
+		}
+	}
+}
+
+/// Extracts the receive timestamp from the control messages attached to a received frame.
+///
+/// Iterates through all received control messages to get the one containing the timestamp.
+/// This is probably a bit overkill, since the timestamp control message should be the only one present.
+fn read_timestamp(msg: &libc::msghdr) -> (i64, u32) {
+	let mut cmsg: *const libc::cmsghdr = unsafe { libc::CMSG_FIRSTHDR(&raw const *msg) };
+	while !cmsg.is_null() {
+		let cmsg_hdr = unsafe { &*cmsg };
+
+		if cmsg_hdr.cmsg_level == libc::SOL_SOCKET && cmsg_hdr.cmsg_type == libc::SO_TIMESTAMPNS_NEW {
+			let timestamp_ptr = unsafe { libc::CMSG_DATA(cmsg) } as *const KernelTimespec;
+			// The pointer to the control message data is not guaranteed to be aligned.
+			let timestamp = unsafe { timestamp_ptr.read_unaligned() };
+
+			return (timestamp.tv_sec, timestamp.tv_nsec as u32);
+		}
+
+		cmsg = unsafe { libc::CMSG_NXTHDR(&raw const *msg, cmsg) };
+	}
+
+	unreachable!("did not receive timestamp control message");
+}
+
+/// Holds the frame and control message buffers used by `EthernetSocket::recv_batch`, so that they can be reused
+/// across calls without any per-call allocation.
+pub struct RecvBatch {
+	buffers: Box<[[u8; MAX_FRAME_LENGTH]; BATCH_LENGTH]>,
+	cmsg_buffers: Box<[CMsgBuffer; BATCH_LENGTH]>,
+	infos: Vec<RecvInfo>,
+}
+
+impl RecvBatch {
+	/// Creates a new (empty) batch with capacity for `BATCH_LENGTH` frames.
+	pub fn new() -> Self {
+		Self {
+			buffers: Box::new([[0; MAX_FRAME_LENGTH]; BATCH_LENGTH]),
+			cmsg_buffers: Box::new(std::array::from_fn(|_| CMsgBuffer::new())),
+			infos: Vec::with_capacity(BATCH_LENGTH),
+		}
+	}
+
+	/// Returns an iterator over the frames received by the last call to `EthernetSocket::recv_batch`, yielding the
+	/// information about each frame along with its payload.
+	pub fn frames(&self) -> impl Iterator<Item = (&RecvInfo, &[u8])> {
+		self.infos
+			.iter()
+			.zip(self.buffers.iter())
+			.map(|(info, buffer)| (info, &buffer[..info.length]))
+	}
+}
+
+impl Default for RecvBatch {
+	fn default() -> Self {
+		Self::new()
+	}
+}
+
 #[derive(Debug)]
 pub struct EthernetSocket {
 	fd: OwnedFd,
@@ -93,7 +190,7 @@ impl EthernetSocket {
 	///
 	/// If `interface` is `None`, Ethernet frames will be received from all network interfaces. Otherwise, frames will
 	/// only be received on the specified interface.
-	pub fn new(interface: &OsStr, source_addr: MacAddress) -> std::io::Result<Self> {
+	pub fn new(interface: &OsStr, source_addr: MacAddress, busy_poll: Option<u32>) -> std::io::Result<Self> {
 
 		// Create the socket.
 		// - `AF_PACKET` specifies that the socket is for receiving layer 2 frames (see the `packet(7)` man page).
@@ -155,6 +252,26 @@ impl EthernetSocket {
 			return Err(std::io::Error::last_os_error());
 		}
 
+		// Optionally enable the `SO_BUSY_POLL` socket option, which makes a blocking receive busy poll the network
+		// driver for new frames for up to the specified number of microseconds before going to sleep. This avoids the
+		// wake-up latency of the interrupt-driven path when frames arrive close together, at the cost of CPU time.
+		if let Some(busy_poll_us) = busy_poll {
+			let optval = busy_poll_us as c_int;
+			let result = unsafe {
+				libc::setsockopt(
+					socket,
+					libc::SOL_SOCKET,
+					libc::SO_BUSY_POLL,
+					&raw const optval as *const c_void,
+					size_of::<c_int>() as libc::socklen_t,
+				)
+			};
+			// `setsockopt` returns -1 on error, with the error code in `errno`.
+			if result == -1 {
+				return Err(std::io::Error::last_os_error());
+			}
+		}
+
 		// Configure the network interface to receive frames with the specified multicast destination address.
 		let mreq = libc::packet_mreq {
 			mr_ifindex: interface_index as c_int,
@@ -186,36 +303,8 @@ impl EthernetSocket {
 	///
 	/// This function will block until a frame is received.
 	pub fn recv(&self, buf: &mut [u8]) -> std::io::Result<RecvInfo> {
-		// This matches Linux's `__kernel_timespec` type, which uses 64 bit fields even on 32 bit systems.
-		#[repr(C)]
-		struct KernelTimespec {
-			tv_sec: c_longlong,
-			tv_nsec: c_longlong,
-		}
-
-		// Timestamps are received as control messages (also known as ancillary data), which requires a separate buffer.
-		// This buffer must have enough space for both the timestamp and some additional metadata; the total size is
-		// calculated using `CMSG_SPACE`.
-		const CMSG_BUFFER_LENGTH: usize = unsafe { libc::CMSG_SPACE(size_of::<KernelTimespec>() as u32) } as usize;
-
-		// The control message buffer must have the same alignment as the `cmsghdr` type. A struct is used to control
-		// its alignment.
-		#[repr(C)]
-		struct CMsgBuffer {
-			// Since the struct uses the C representation, the first member is guaranteed to be at offset 0, meaning it
-			// has the same alignment as the struct.
-			buffer: [u8; CMSG_BUFFER_LENGTH],
-			// A zero-sized array does not affect the size of the containing struct, but does affect its alignment.
-			// Since a struct has the same alignment as its most aligned member, this guarantees that it will have an
-			// alignment at least as large as `cmsghdr`.
-			_align: [libc::cmsghdr; 0],
-		}
-
 		// Create an instance of the struct to hold the buffer.
-		let mut cmsg_buffer = CMsgBuffer {
-			buffer: [0; CMSG_BUFFER_LENGTH],
-			_align: [],
-		};
+		let mut cmsg_buffer = CMsgBuffer::new();
 
 		// The `recvmsg` function is able to write data into several non-contiguous buffers. Since we don't need this
 		// feature, we can just specifiy a single buffer.
@@ -240,27 +329,67 @@ impl EthernetSocket {
 			return Err(std::io::Error::last_os_error());
 		}
 
-		// Iterate through all received control messages to get the one containing the timestamp.
-		// This is probably a bit overkill, since the timestamp control message should be the only one present.
-		let mut cmsg: *const libc::cmsghdr = unsafe { libc::CMSG_FIRSTHDR(&raw const msg) };
-		while !cmsg.is_null() {
-			let cmsg_hdr = unsafe { &*cmsg };
-
-			if cmsg_hdr.cmsg_level == libc::SOL_SOCKET && cmsg_hdr.cmsg_type == libc::SO_TIMESTAMPNS_NEW {
-				let timestamp_ptr = unsafe { libc::CMSG_DATA(cmsg) } as *const KernelTimespec;
-				// The pointer to the control message data is not guaranteed to be aligned.
-				let timestamp = unsafe { timestamp_ptr.read_unaligned() };
-
-				return Ok(RecvInfo {
-					length: length as usize,
-					timestamp_s: timestamp.tv_sec,
-					timestamp_ns: timestamp.tv_nsec as u32,
-				});
-			}
+		let (timestamp_s, timestamp_ns) = read_timestamp(&msg);
+
+		Ok(RecvInfo {
+			length: length as usize,
+			timestamp_s,
+			timestamp_ns,
+		})
+	}
+
+	/// Receives up to `BATCH_LENGTH` Ethernet frames on the socket with a single `recvmmsg` call, amortising the
+	/// syscall cost across the whole batch. The received frames replace the previous contents of `batch` and can be
+	/// iterated with `RecvBatch::frames`.
+	///
+	/// This function will block until at least one frame is received; it does not wait for the batch to fill up.
+	pub fn recv_batch(&self, batch: &mut RecvBatch) -> std::io::Result<usize> {
+		// As with `recv`, each message gets a single buffer to receive the payload into.
+		let mut iovecs: [libc::iovec; BATCH_LENGTH] = std::array::from_fn(|i| libc::iovec {
+			iov_base: batch.buffers[i].as_mut_ptr() as *mut c_void,
+			iov_len: MAX_FRAME_LENGTH,
+		});
+
+		let mut headers: [libc::mmsghdr; BATCH_LENGTH] = std::array::from_fn(|i| libc::mmsghdr {
+			msg_hdr: libc::msghdr {
+				msg_name: std::ptr::null_mut(),
+				msg_namelen: 0,
+				msg_iov: &raw mut iovecs[i],
+				msg_iovlen: 1,
+				msg_control: batch.cmsg_buffers[i].buffer.as_mut_ptr() as *mut c_void,
+				msg_controllen: CMSG_BUFFER_LENGTH,
+				msg_flags: 0,
+			},
+			// Filled in by the kernel with the length of the received frame.
+			msg_len: 0,
+		});
+
+		// `MSG_WAITFORONE` makes `recvmmsg` block only until the first frame arrives; any further frames that are
+		// already queued are returned with it, without waiting for the full batch.
+		let count = unsafe {
+			libc::recvmmsg(
+				self.fd.as_raw_fd(),
+				headers.as_mut_ptr(),
+				BATCH_LENGTH as c_uint,
+				libc::MSG_WAITFORONE as c_int,
+				std::ptr::null_mut(),
+			)
+		};
+		// `recvmmsg` returns -1 on error, with the error code in `errno`.
+		if count == -1 {
+			return Err(std::io::Error::last_os_error());
+		}
 
-			cmsg = unsafe { libc::CMSG_NXTHDR(&raw const msg, cmsg) };
+		batch.infos.clear();
+		for header in &headers[..count as usize] {
+			let (timestamp_s, timestamp_ns) = read_timestamp(&header.msg_hdr);
+			batch.infos.push(RecvInfo {
+				length: header.msg_len as usize,
+				timestamp_s,
+				timestamp_ns,
+			});
 		}
 
-		unreachable!("did not receive timestamp control message");
+		Ok(count as usize)
 	}
 }
@@ -60,35 +60,37 @@ pub struct Sample {
 impl Sample {
 	fn read(reader: &mut BytesReader<'_>, encoding: Encoding) -> Result<Self, DecodeError> {
 		let bytes = ber::read_octet_string(reader, encoding)?;
-		if bytes.len() != 64 {
-			// TODO: Specific error type.
-			return Err(DecodeError::InvalidIntegerEncoding);
-		}
 
-		let mut values_iter = bytes
-			.chunks_exact(8)
-			.map(|chunk| i32::from_be_bytes(chunk[0..4].try_into().unwrap()) as f64);
+		// Converting to a fixed-size array up front means the reads below are all at constant offsets with no bounds
+		// checks.
+		// TODO: Specific error type.
+		let bytes: &[u8; 64] = bytes.try_into().map_err(|_| DecodeError::InvalidIntegerEncoding)?;
+
+		// Each value is an 8 byte chunk consisting of a 4 byte big-endian value followed by 4 bytes of quality flags
+		// (which are currently ignored).
+		let value =
+			|offset: usize| i32::from_be_bytes([bytes[offset], bytes[offset + 1], bytes[offset + 2], bytes[offset + 3]]) as f64;
 
 		let current_scale = 0.001;
 		let voltage_scale = 0.01;
 
 		Ok(Self {
-			current_a: (values_iter.next().unwrap() * current_scale) as f32,
-			current_b: (values_iter.next().unwrap() * current_scale) as f32,
-			current_c: (values_iter.next().unwrap() * current_scale) as f32,
-			current_n: (values_iter.next().unwrap() * current_scale) as f32,
-			voltage_a: (values_iter.next().unwrap() * voltage_scale) as f32,
-			voltage_b: (values_iter.next().unwrap() * voltage_scale) as f32,
-			voltage_c: (values_iter.next().unwrap() * voltage_scale) as f32,
-			voltage_n: (values_iter.next().unwrap() * voltage_scale) as f32,
+			current_a: (value(0) * current_scale) as f32,
+			current_b: (value(8) * current_scale) as f32,
+			current_c: (value(16) * current_scale) as f32,
+			current_n: (value(24) * current_scale) as f32,
+			voltage_a: (value(32) * voltage_scale) as f32,
+			voltage_b: (value(40) * voltage_scale) as f32,
+			voltage_c: (value(48) * voltage_scale) as f32,
+			voltage_n: (value(56) * voltage_scale) as f32,
 		})
 	}
 }
 
 #[derive(Debug, Clone)]
-pub struct Asdu {
-	pub svid: String,
-	pub datset: Option<String>,
+pub struct Asdu<'b> {
+	pub svid: &'b str,
+	pub datset: Option<&'b str>,
 	pub smp_cnt: u16,
 	pub conf_rev: u32,
 	pub refr_tm: Option<u64>,
@@ -98,7 +100,7 @@ pub struct Asdu {
 	pub smp_mod: Option<u16>,
 }
 
-fn read_asdu(reader: &mut BytesReader<'_>) -> Result<Asdu, DecodeError> {
+fn read_asdu<'b>(reader: &mut BytesReader<'b>) -> Result<Asdu<'b>, DecodeError> {
 	// svID [0] IMPLICIT VisibleString
 	let svid = ber::read_required_identifier(reader, Tag::ContextSpecific(0))
 		.and_then(|encoding| ber::read_visiblestring(reader, encoding))?;
@@ -143,8 +145,8 @@ fn read_asdu(reader: &mut BytesReader<'_>) -> Result<Asdu, DecodeError> {
 	// TODO: gmIdentity [9] IMPLICIT OCTET STRING (SIZE(8)) OPTIONAL
 
 	Ok(Asdu {
-		svid: svid.into(),
-		datset: datset.map(Into::into),
+		svid,
+		datset,
 		smp_cnt,
 		conf_rev,
 		refr_tm,
@@ -155,7 +157,7 @@ fn read_asdu(reader: &mut BytesReader<'_>) -> Result<Asdu, DecodeError> {
 	})
 }
 
-fn read_savpdu(reader: &mut BytesReader<'_>) -> Result<Vec<Asdu>, DecodeError> {
+fn read_savpdu<'b>(reader: &mut BytesReader<'b>) -> Result<Vec<Asdu<'b>>, DecodeError> {
 	// noASDU [0] IMPLICIT INTEGER (1..65535)
 	let encoding = ber::read_required_identifier(reader, Tag::ContextSpecific(0))?;
 	let no_asdu = ber::read_integer_as_u16(reader, encoding)?;
@@ -185,18 +187,19 @@ fn read_savpdu(reader: &mut BytesReader<'_>) -> Result<Vec<Asdu>, DecodeError> {
 }
 
 #[derive(Debug, Clone)]
-pub struct SvMessage {
+pub struct SvMessage<'b> {
 	pub appid: u16,
-	pub asdus: Vec<Asdu>,
+	pub asdus: Vec<Asdu<'b>>,
 }
 
-pub fn parse(bytes: &[u8]) -> Result<SvMessage, DecodeError> {
+pub fn parse(bytes: &[u8]) -> Result<SvMessage<'_>, DecodeError> {
 	let mut reader = BytesReader::new(bytes);
 
-	let appid = reader.read_u16_be()?;
-	let length = reader.read_u16_be()? as usize;
-	let _reserved_1 = reader.read_u16_be()?;
-	let _reserved_2 = reader.read_u16_be()?;
+	// The header consists of four big-endian u16 fields (appid, length, reserved 1, reserved 2); read it as a single
+	// 8 byte block. The reserved fields are ignored.
+	let header: [u8; 8] = reader.read_u8_array()?;
+	let appid = u16::from_be_bytes([header[0], header[1]]);
+	let length = u16::from_be_bytes([header[2], header[3]]) as usize;
 
 	if length < 8 {
 		return Err(DecodeError::LengthOutOfRange.into());
@@ -7,10 +7,9 @@ use std::{
 use clap::Parser;
 use mu_rust::{
 	config::Configuration,
-	ethernet::EthernetSocket,
+	ethernet::{EthernetSocket, RecvBatch},
 	parse,
 	sample_buffer::{sender_thread_fn, SampleBufferQueue},
-	DecodeError,
 };
 use thiserror::Error;
 
@@ -24,8 +23,6 @@ struct CommandLineArgs {
 enum MainError {
 	#[error(transparent)]
 	Io(#[from] std::io::Error),
-	#[error(transparent)]
-	Decode(#[from] DecodeError),
 }
 
 fn main() -> Result<(), MainError> {
@@ -50,34 +47,48 @@ fn main() -> Result<(), MainError> {
 		},
 	};
 
-	let recv_socket = EthernetSocket::new(OsStr::new(&configuration.interface), configuration.mac_address)?;
+	let recv_socket = EthernetSocket::new(
+		OsStr::new(&configuration.interface),
+		configuration.mac_address,
+		configuration.busy_poll,
+	)?;
 
 	log::info!("Bound socket to interface '{}'.", &configuration.interface);
 	log::info!("Multicast address is '{}'.", &configuration.mac_address);
 
-	let mut buf = [0_u8; 1522]; // The maximum size of an Ethernet frame is 1522 bytes.
+	let mut batch = RecvBatch::new();
 
 	let buffer_length = configuration.sample_rate / (configuration.nominal_frequency * 2);
 
 	let send_socket = UdpSocket::bind((Ipv4Addr::UNSPECIFIED, 0))?;
+	// Connecting the socket up front means each flush can use send() without the kernel re-validating the
+	// destination address on every datagram.
+	send_socket.connect(configuration.destination)?;
 
 	let sample_buffer_queue = SampleBufferQueue::new();
 
 	log::info!("Datagrams will be sent to {}.", &configuration.destination);
 
 	std::thread::scope(|scope| {
-		let _sender_thread = scope.spawn(|| sender_thread_fn(&sample_buffer_queue, send_socket, configuration.destination, &configuration.channels));
+		let _sender_thread = scope.spawn(|| sender_thread_fn(&sample_buffer_queue, send_socket, &configuration.channels));
 		loop {
-			let info = recv_socket.recv(&mut buf)?;
-			let sv_message = parse(&buf[0..info.length])?;
-			for asdu in sv_message.asdus {
+			recv_socket.recv_batch(&mut batch)?;
+			for (info, frame) in batch.frames() {
+				let sv_message = match parse(frame) {
+					Ok(message) => message,
+					Err(err) => {
+						// A malformed frame should not take down the bridge; drop it and keep receiving.
+						log::warn!("Failed to parse sampled value message: {err}");
+						continue;
+					}
+				};
 				assert!(info.timestamp_s >= 0); // TODO: handle correctly (probably just ignore sample entirely)
-				sample_buffer_queue.insert_sample(
+				sample_buffer_queue.insert_samples(
 					info.timestamp_s as u64,
 					info.timestamp_ns,
 					configuration.sample_rate,
 					buffer_length,
-					asdu,
+					sv_message.asdus,
 				);
 			}
 		}
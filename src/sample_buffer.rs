@@ -1,7 +1,7 @@
 use std::{
 	collections::VecDeque,
 	fmt::Write,
-	net::{SocketAddr, UdpSocket},
+	net::UdpSocket,
 	sync::{
 		Condvar, Mutex,
 		atomic::{AtomicBool, Ordering},
@@ -78,37 +78,14 @@ impl SampleTime {
 		Self(self.0 - (self.0 % buffer_length as u64))
 	}
 
-	/// Converts this timestamp into a Gregorian calendar date and time. Returns a tuple containing the year, month,
-	/// day, hours, minutes, seconds and microseconds, in that order. The values for the day and month start at 1.
-	pub fn to_date_time(self, sample_rate: u32) -> (u32, u32, u32, u32, u32, u32, u32) {
-		// This implementation is based on the formulas presented in the book 'Calendrical Calculations' by Edward M.
-		// Reingold and Nachum Dershowitz.
-		// TODO: A more efficient algorithm could be used.
-
-		let date = self.0 / (86400 * sample_rate as u64) + fixed_from_gregorian(1970, 1, 1);
-
-		let d_0 = date - 1;
-		let n_400 = d_0 / 146097;
-		let d_1 = d_0 % 146097;
-		let n_100 = d_1 / 36524;
-		let d_2 = d_1 % 36524;
-		let n_4 = d_2 / 1461;
-		let d_3 = d_2 % 1461;
-		let n_1 = d_3 / 365;
-		let year = 400 * n_400 + 100 * n_100 + 4 * n_4 + n_1 + if n_100 == 4 || n_4 == 4 { 0 } else { 1 };
-
-		let prior_days = date - fixed_from_gregorian(year, 1, 1);
-		let correction = if date < fixed_from_gregorian(year, 3, 1) {
-			0
-		} else if is_gregorian_leap_year(year) {
-			1
-		} else {
-			2
-		};
-
-		let month = (12 * (prior_days + correction) + 373) / 367;
-		let day = date - fixed_from_gregorian(year, month, 1) + 1;
+	/// Returns the number of whole days since the Unix epoch.
+	pub fn days(self, sample_rate: u32) -> u64 {
+		self.0 / (86400 * sample_rate as u64)
+	}
 
+	/// Converts this timestamp into a time of day. Returns a tuple containing the hours, minutes, seconds and
+	/// microseconds, in that order.
+	pub fn to_time_of_day(self, sample_rate: u32) -> (u32, u32, u32, u32) {
 		let time = (self.0 % (86400 * sample_rate as u64) / sample_rate as u64) as u32;
 		let hours = time / 3600;
 		let minutes = time % 3600 / 60;
@@ -116,15 +93,68 @@ impl SampleTime {
 
 		let microseconds = ((self.0 % sample_rate as u64) as f32 / sample_rate as f32 * 1_000_000.0) as u32;
 
-		(
-			year as u32,
-			month as u32,
-			day as u32,
-			hours,
-			minutes,
-			seconds,
-			microseconds,
-		)
+		(hours, minutes, seconds, microseconds)
+	}
+
+	/// Converts this timestamp into a Gregorian calendar date and time. Returns a tuple containing the year, month,
+	/// day, hours, minutes, seconds and microseconds, in that order. The values for the day and month start at 1.
+	pub fn to_date_time(self, sample_rate: u32) -> (u32, u32, u32, u32, u32, u32, u32) {
+		let (year, month, day) = gregorian_from_days(self.days(sample_rate));
+		let (hours, minutes, seconds, microseconds) = self.to_time_of_day(sample_rate);
+		(year, month, day, hours, minutes, seconds, microseconds)
+	}
+}
+
+/// Converts a number of whole days since the Unix epoch into a Gregorian calendar date. Returns a tuple containing
+/// the year, month and day, in that order. The values for the day and month start at 1.
+fn gregorian_from_days(days: u64) -> (u32, u32, u32) {
+	// This implementation is based on the formulas presented in the book 'Calendrical Calculations' by Edward M.
+	// Reingold and Nachum Dershowitz.
+	// TODO: A more efficient algorithm could be used.
+
+	let date = days + fixed_from_gregorian(1970, 1, 1);
+
+	let d_0 = date - 1;
+	let n_400 = d_0 / 146097;
+	let d_1 = d_0 % 146097;
+	let n_100 = d_1 / 36524;
+	let d_2 = d_1 % 36524;
+	let n_4 = d_2 / 1461;
+	let d_3 = d_2 % 1461;
+	let n_1 = d_3 / 365;
+	let year = 400 * n_400 + 100 * n_100 + 4 * n_4 + n_1 + if n_100 == 4 || n_4 == 4 { 0 } else { 1 };
+
+	let prior_days = date - fixed_from_gregorian(year, 1, 1);
+	let correction = if date < fixed_from_gregorian(year, 3, 1) {
+		0
+	} else if is_gregorian_leap_year(year) {
+		1
+	} else {
+		2
+	};
+
+	let month = (12 * (prior_days + correction) + 373) / 367;
+	let day = date - fixed_from_gregorian(year, month, 1) + 1;
+
+	(year as u32, month as u32, day as u32)
+}
+
+/// Caches the most recent result of [`gregorian_from_days`]. The calendar conversion is the most expensive part of
+/// formatting a buffer's timestamp, and its result only changes once per day while flushes happen many times per
+/// second.
+#[derive(Debug, Default)]
+pub struct DateCache {
+	days: Option<u64>,
+	date: (u32, u32, u32),
+}
+
+impl DateCache {
+	fn get(&mut self, days: u64) -> (u32, u32, u32) {
+		if self.days != Some(days) {
+			self.days = Some(days);
+			self.date = gregorian_from_days(days);
+		}
+		self.date
 	}
 }
 
@@ -145,33 +175,15 @@ fn fixed_from_gregorian(year: u64, month: u64, day: u64) -> u64 {
 		- if month <= 2 { 0 } else if is_gregorian_leap_year(year) { 1 } else { 2 }
 }
 
-/// A struct containing sample data for a single channel in a sample buffer. The `SampleBuffer` struct contains one
-/// `SampleBufferChannel` for each voltage or current channel.
-///
-/// This struct also keeps track of the largest absolute value currently stored in the buffer. This avoids the need to
-/// search through the entire buffer later.
-#[derive(Debug)]
-pub struct SampleBufferChannel {
-	/// Array of sample data for this channel.
-	buffer: Box<[f32]>,
-	/// The largest absolute value stored in this channel buffer.
-	max: f32,
-}
-
-impl SampleBufferChannel {
-	/// Creates a new sample buffer channel containing `length` samples, with each sample initialised to zero.
-	pub fn new(length: usize) -> Self {
-		let buffer = vec![0.0; length].into_boxed_slice();
-		Self { buffer, max: 0.0 }
-	}
+/// The number of channels in a sample buffer (4 currents followed by 4 voltages).
+const CHANNEL_COUNT: usize = 8;
 
-	/// Inserts a sample at the specified index in the buffer, updating the `max` field if necessary.
-	/// TODO: What should happen if samples are inserted at the same position multiple times? Simply overwriting may
-	///       cause `max` to be incorrect.
-	pub fn insert_sample(&mut self, index: u32, value: f32) {
-		self.buffer[index as usize] = value;
-		self.max = self.max.max(value.abs());
-	}
+/// Returns the largest absolute value in a channel's sample data.
+///
+/// This is computed when needed (at flush time) rather than being tracked on every insert, which keeps inserts to a
+/// plain store and stays correct if a sample is overwritten with a smaller value.
+fn channel_max(samples: &[f32]) -> f32 {
+	samples.iter().fold(0.0, |max, value| max.max(value.abs()))
 }
 
 const SEND_DELAY: f64 = 0.05;
@@ -187,12 +199,16 @@ pub enum BufferFlushError {
 /// A struct containing sample data corresponding to a particular period of time.
 #[derive(Debug)]
 pub struct SampleBuffer {
-	/// The sample data, split into individual channels.
-	channels: [SampleBufferChannel; 8],
+	/// The sample data for every channel, stored as a single contiguous allocation with each channel's `length`
+	/// samples laid out back to back (channel 0 first).
+	samples: Box<[f32]>,
 	/// The sample rate of the samples in the buffer.
 	sample_rate: u32,
 	/// The timestamp corresponding to the first sample in the buffer.
 	start_time: SampleTime,
+	/// The timestamp one sample period past the last sample in the buffer (i.e. `start_time` plus `length` samples).
+	/// This is stored so that the timespan checks done for every incoming sample don't need to recompute it.
+	end_time: SampleTime,
 	/// The time at which this buffer was created. This is used for calculating the time at which to send the buffer,
 	/// since it accounts for network latency.
 	creation_time: SampleTime,
@@ -205,73 +221,103 @@ impl SampleBuffer {
 	/// Creates a new sample buffer with the specified start time, creation time, length and sample rate. All samples
 	/// are initialised to zero.
 	pub fn new(sample_rate: u32, start_time: SampleTime, creation_time: SampleTime, length: u32) -> Self {
-		let channels = std::array::from_fn(|_| SampleBufferChannel::new(length as usize));
+		let samples = vec![0.0; length as usize * CHANNEL_COUNT].into_boxed_slice();
 		Self {
-			channels,
+			samples,
 			sample_rate,
 			start_time,
+			end_time: start_time.add_samples(length),
 			creation_time,
 			length,
 		}
 	}
 
+	/// Returns the sample data for the channel with the specified index.
+	fn channel(&self, index: usize) -> &[f32] {
+		let length = self.length as usize;
+		&self.samples[index * length..(index + 1) * length]
+	}
+
 	/// Insert a sample into the buffer at the specified position.
 	pub fn insert_sample(&mut self, smp_cnt: u32, sample: Sample) {
 		let index = smp_cnt - self.start_time.subsec_samples(self.sample_rate);
 		if index < self.length {
-			self.channels[0].insert_sample(index, sample.current_a);
-			self.channels[1].insert_sample(index, sample.current_b);
-			self.channels[2].insert_sample(index, sample.current_c);
-			self.channels[3].insert_sample(index, sample.current_n);
-			self.channels[4].insert_sample(index, sample.voltage_a);
-			self.channels[5].insert_sample(index, sample.voltage_b);
-			self.channels[6].insert_sample(index, sample.voltage_c);
-			self.channels[7].insert_sample(index, sample.voltage_n);
+			let index = index as usize;
+			let length = self.length as usize;
+			self.samples[index] = sample.current_a;
+			self.samples[length + index] = sample.current_b;
+			self.samples[2 * length + index] = sample.current_c;
+			self.samples[3 * length + index] = sample.current_n;
+			self.samples[4 * length + index] = sample.voltage_a;
+			self.samples[5 * length + index] = sample.voltage_b;
+			self.samples[6 * length + index] = sample.voltage_c;
+			self.samples[7 * length + index] = sample.voltage_n;
 		}
 	}
 
-	/// Generates an OpenPMU XML sample datagram and sends it to the specified destination.
-	pub fn flush(&self, out_skt: &UdpSocket, dest: SocketAddr, channels: &[OutputChannel]) -> Result<(), BufferFlushError> {
+	/// Generates an OpenPMU XML sample datagram and sends it on the specified socket, which must already be connected
+	/// to the destination.
+	///
+	/// The datagram is built in `buf` and the big-endian sample bytes for each channel are staged in `payload_buf`.
+	/// Both are cleared before use; passing the same buffers to every call allows their allocations to be reused
+	/// across flushes.
+	pub fn flush(
+		&self,
+		out_skt: &UdpSocket,
+		channels: &[OutputChannel],
+		buf: &mut String,
+		payload_buf: &mut Vec<u8>,
+		date_cache: &mut DateCache,
+	) -> Result<(), BufferFlushError> {
 		let frame = self.start_time.subsec_samples(self.sample_rate) / self.length;
 
-		let (year, month, day, hours, minutes, seconds, microseconds) = self.start_time.to_date_time(self.sample_rate);
+		let (year, month, day) = date_cache.get(self.start_time.days(self.sample_rate));
+		let (hours, minutes, seconds, microseconds) = self.start_time.to_time_of_day(self.sample_rate);
 
-		let mut buf = String::new();
-		writeln!(&mut buf, "<OpenPMU>")?;
-		writeln!(&mut buf, "\t<Format>Samples</Format>")?;
-		writeln!(&mut buf, "\t<Date>{year:04}-{month:02}-{day:02}</Date>")?;
+		buf.clear();
+		writeln!(buf, "<OpenPMU>")?;
+		writeln!(buf, "\t<Format>Samples</Format>")?;
+		writeln!(buf, "\t<Date>{year:04}-{month:02}-{day:02}</Date>")?;
 		writeln!(
-			&mut buf,
+			buf,
 			"\t<Time>{hours:02}:{minutes:02}:{seconds:02}.{microseconds:06}</Time>"
 		)?;
-		writeln!(&mut buf, "\t<Frame>{frame}</Frame>")?;
-		writeln!(&mut buf, "\t<Fs>{}</Fs>", self.sample_rate)?;
-		writeln!(&mut buf, "\t<n>{}</n>", self.length)?;
-		writeln!(&mut buf, "\t<bits>16</bits>")?;
-		writeln!(&mut buf, "\t<Channels>{}</Channels>", channels.len())?;
+		writeln!(buf, "\t<Frame>{frame}</Frame>")?;
+		writeln!(buf, "\t<Fs>{}</Fs>", self.sample_rate)?;
+		writeln!(buf, "\t<n>{}</n>", self.length)?;
+		writeln!(buf, "\t<bits>16</bits>")?;
+		writeln!(buf, "\t<Channels>{}</Channels>", channels.len())?;
 
 		for (i, channel) in channels.iter().enumerate() {
 			let type_ = match channel.type_ {
 				OutputChannelType::Voltage => "V",
 				OutputChannelType::Current => "I",
 			};
-			write_xml_channel_data(&mut buf, i, &channel.name, type_, &channel.phase, &self.channels[channel.input_channel])?;
+			write_xml_channel_data(
+				buf,
+				payload_buf,
+				i,
+				&channel.name,
+				type_,
+				&channel.phase,
+				self.channel(channel.input_channel),
+			)?;
 		}
 
-		writeln!(&mut buf, "</OpenPMU>")?;
+		writeln!(buf, "</OpenPMU>")?;
 
-		out_skt.send_to(buf.as_bytes(), dest)?;
+		out_skt.send(buf.as_bytes())?;
 		Ok(())
 	}
 
 	/// Given a sample timestamp, determines if it falls within this buffer's timespan.
 	pub fn is_sample_within_timespan(&self, timestamp: SampleTime) -> bool {
-		timestamp >= self.start_time && timestamp < self.start_time.add_samples(self.length)
+		timestamp >= self.start_time && timestamp < self.end_time
 	}
 
 	/// Given a sample timestamp, determines if it comes after the end of this buffer's timespan.
 	pub fn is_sample_after_timespan(&self, timestamp: SampleTime) -> bool {
-		timestamp >= self.start_time.add_samples(self.length)
+		timestamp >= self.end_time
 	}
 
 	/// Calculates the time at which this buffer should be sent.
@@ -285,30 +331,37 @@ impl SampleBuffer {
 
 fn write_xml_channel_data(
 	buf: &mut String,
+	payload_buf: &mut Vec<u8>,
 	index: usize,
 	name: &str,
 	type_: &str,
 	phase: &str,
-	channel: &SampleBufferChannel,
+	channel: &[f32],
 ) -> Result<(), BufferFlushError> {
 	writeln!(buf, "\t<Channel_{index}>")?;
 	writeln!(buf, "\t\t<Name>{name}</Name>")?;
 	writeln!(buf, "\t\t<Type>{type_}</Type>")?;
 	writeln!(buf, "\t\t<Phase>{phase}</Phase>")?;
-	writeln!(buf, "\t\t<Range>{}</Range>", channel.max)?;
+	let max = channel_max(channel);
+	writeln!(buf, "\t\t<Range>{max}</Range>")?;
 
-	let mut channel_bytes_buf = Vec::with_capacity(channel.buffer.len() * 2);
-	if channel.max == 0.0 {
-		channel_bytes_buf.resize(channel.buffer.len() * 2, 0);
+	payload_buf.clear();
+	if max == 0.0 {
+		payload_buf.resize(channel.len() * 2, 0);
 	} else {
-		for &value in &channel.buffer {
-			let converted = (value / channel.max * 32767.0) as i16;
-			channel_bytes_buf.extend(converted.to_be_bytes());
+		// Dividing once here turns the per-sample division into a multiplication, which is much cheaper and easier
+		// for the compiler to vectorise.
+		let scale = 32767.0 / max;
+		for &value in channel {
+			// Round to nearest rather than truncating toward zero, which halves the worst-case quantisation error.
+			// The `as` conversion saturates, so a scaled value that rounds just past ±32767 cannot wrap.
+			let converted = (value * scale).round() as i16;
+			payload_buf.extend(converted.to_be_bytes());
 		}
 	}
 
 	write!(buf, "\t\t<Payload>")?;
-	base64::engine::general_purpose::STANDARD.encode_string(&channel_bytes_buf, buf);
+	base64::engine::general_purpose::STANDARD.encode_string(&*payload_buf, buf);
 	writeln!(buf, "</Payload>")?;
 
 	writeln!(buf, "\t</Channel_{index}>")?;
@@ -333,7 +386,36 @@ impl SampleBufferQueue {
 		recv_time_nsec: u32,
 		sample_rate: u32,
 		buffer_length: u32,
-		asdu: Asdu,
+		asdu: Asdu<'_>,
+	) {
+		let mut queue = self.queue.lock().expect("queue mutex was poisoned");
+		self.insert_sample_inner(&mut queue, recv_time_sec, recv_time_nsec, sample_rate, buffer_length, asdu);
+	}
+
+	/// Inserts the samples from every ASDU of a single message, taking the queue lock once for the whole batch rather
+	/// than once per ASDU.
+	pub fn insert_samples<'b>(
+		&self,
+		recv_time_sec: u64,
+		recv_time_nsec: u32,
+		sample_rate: u32,
+		buffer_length: u32,
+		asdus: impl IntoIterator<Item = Asdu<'b>>,
+	) {
+		let mut queue = self.queue.lock().expect("queue mutex was poisoned");
+		for asdu in asdus {
+			self.insert_sample_inner(&mut queue, recv_time_sec, recv_time_nsec, sample_rate, buffer_length, asdu);
+		}
+	}
+
+	fn insert_sample_inner(
+		&self,
+		queue: &mut VecDeque<SampleBuffer>,
+		recv_time_sec: u64,
+		recv_time_nsec: u32,
+		sample_rate: u32,
+		buffer_length: u32,
+		asdu: Asdu<'_>,
 	) {
 		let sample_time_sec = if asdu.smp_cnt as u64 * NS_PER_SEC > recv_time_nsec as u64 * sample_rate as u64 {
 			recv_time_sec - 1
@@ -343,30 +425,43 @@ impl SampleBufferQueue {
 
 		let timestamp = SampleTime::from_seconds_and_samples(sample_time_sec, asdu.smp_cnt as u32, sample_rate);
 
-		let mut queue = self.queue.lock().expect("queue mutex was poisoned");
-
-		if queue
-			.back()
-			.is_none_or(|buffer| buffer.is_sample_after_timespan(timestamp))
-		{
-			let mut new_buffer = SampleBuffer::new(
-				sample_rate,
-				timestamp.buffer_start_time(buffer_length),
-				SampleTime::from_seconds_and_nanoseconds(recv_time_sec, recv_time_nsec, sample_rate),
-				buffer_length,
-			);
-			new_buffer.insert_sample(asdu.smp_cnt as u32, asdu.sample);
-			queue.push_back(new_buffer);
-			self.cond_var.notify_one();
-		} else {
-			let buffer = queue
-				.iter_mut()
-				.rev()
-				.find(|buffer| buffer.is_sample_within_timespan(timestamp));
-
-			if let Some(buffer) = buffer {
+		if let Some(buffer) = queue.back_mut() {
+			// In the steady state almost every sample lands in the newest buffer, so check it directly before doing
+			// anything else.
+			if buffer.is_sample_within_timespan(timestamp) {
 				buffer.insert_sample(asdu.smp_cnt as u32, asdu.sample);
+				return;
 			}
+
+			if !buffer.is_sample_after_timespan(timestamp) {
+				// The sample arrived late and belongs to an older buffer; search the rest of the queue, newest first.
+				let buffer = queue
+					.iter_mut()
+					.rev()
+					.skip(1)
+					.find(|buffer| buffer.is_sample_within_timespan(timestamp));
+
+				if let Some(buffer) = buffer {
+					buffer.insert_sample(asdu.smp_cnt as u32, asdu.sample);
+				}
+				return;
+			}
+		}
+
+		// The queue is empty or the sample comes after the newest buffer, so a new buffer is needed.
+		let mut new_buffer = SampleBuffer::new(
+			sample_rate,
+			timestamp.buffer_start_time(buffer_length),
+			SampleTime::from_seconds_and_nanoseconds(recv_time_sec, recv_time_nsec, sample_rate),
+			buffer_length,
+		);
+		new_buffer.insert_sample(asdu.smp_cnt as u32, asdu.sample);
+		let was_empty = queue.is_empty();
+		queue.push_back(new_buffer);
+		// The sender thread only ever blocks on the condition variable while the queue is empty, so a notification is
+		// only needed when this push makes the queue non-empty.
+		if was_empty {
+			self.cond_var.notify_one();
 		}
 	}
 
@@ -399,13 +494,20 @@ impl SampleBufferQueue {
 	}
 }
 
-pub fn sender_thread_fn(queue: &SampleBufferQueue, out_socket: UdpSocket, dest: SocketAddr, channels: &[OutputChannel]) {
+pub fn sender_thread_fn(queue: &SampleBufferQueue, out_socket: UdpSocket, channels: &[OutputChannel]) {
+	// Reused for every datagram so that their allocations only grow once.
+	let mut buf = String::new();
+	let mut payload_buf = Vec::new();
+	let mut date_cache = DateCache::default();
+
 	while let Some(sleep_time) = queue.wait_for_sample_buffer() {
 		if sleep_time > 0.0 {
 			std::thread::sleep(Duration::from_secs_f64(sleep_time));
 		}
 
 		let buffer = queue.pop_sample_buffer();
-		buffer.flush(&out_socket, dest, channels).unwrap();
+		buffer
+			.flush(&out_socket, channels, &mut buf, &mut payload_buf, &mut date_cache)
+			.unwrap();
 	}
 }